@@ -1,115 +1,352 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import re
+import hashlib
+import time
 import numpy as np
 from datetime import datetime
+from pandas.tseries.api import guess_datetime_format
+from io import BytesIO
+from pathlib import Path
 
 st.set_page_config(page_title="Excel Chatbot", page_icon="📊", layout="wide")
 
-# Preprocessing function
+# On-disk parquet cache of preprocessed uploads. Bump PREPROCESS_VERSION whenever preprocess_data
+# changes so stale frames are not served. Files (i.e. uploaded user data) are deleted after
+# CACHE_MAX_AGE seconds, and only the newest CACHE_MAX_FILES are kept.
+CACHE_DIR = Path(".cache")
+PREPROCESS_VERSION = 1
+CACHE_MAX_FILES = 50
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+_SAMPLE_MD = """
+- What is the average income?
+- How many customers are under 30?
+- Compare loan amount by education
+- Show distribution of balance
+- Show trend of income over time
+- Show pie chart of job category
+"""
+
+_COL_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9]')
+_UNDER_RE = re.compile(r'(under|below|less than)\s+(\d+)')
+_TOKEN_RE = re.compile(r'[a-z0-9_]+')
+
+# Trend lines plot raw timestamps up to this many points, otherwise the smallest bucket that fits
+TREND_MAX_POINTS = 500
+_TREND_BUCKETS = [('s', pd.Timedelta(seconds=1)), ('min', pd.Timedelta(minutes=1)), ('h', pd.Timedelta(hours=1)),
+                  ('D', pd.Timedelta(days=1)), ('W', pd.Timedelta(weeks=1)), ('MS', pd.Timedelta(days=31)),
+                  ('QS', pd.Timedelta(days=92)), ('YS', pd.Timedelta(days=366))]
+
+# Chart intent keywords, one compiled alternation per chart type
+_TREND_RE = re.compile(r'\b(trend|over\s+time|month|year|timeline)', re.I)
+_DIST_RE = re.compile(r'\b(distribution|histogram|spread|frequency)', re.I)
+_CMP_RE = re.compile(r'\b(compare|group|by\b|bar\s+chart)', re.I)
+_PIE_RE = re.compile(r'\bpie\b', re.I)
+
+# Question intent keywords for basic_analysis
+_AVG_RE = re.compile(r'\b(average|mean)', re.I)
+_COUNT_RE = re.compile(r'\b(how\s+many|count)', re.I)
+_GROUP_RE = re.compile(r'\b(compare|group\s+by)', re.I)
+
+# Stable key for an uploaded file's content
+def content_key(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Evict expired and surplus disk-cache files, newest first
+def prune_cache():
+    entries = []
+    for path in CACHE_DIR.glob("*.parquet"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except OSError:
+            pass
+    now = time.time()
+    for i, (mtime, path) in enumerate(sorted(entries, reverse=True)):
+        if i >= CACHE_MAX_FILES or now - mtime > CACHE_MAX_AGE:
+            path.unlink(missing_ok=True)
+
+# Excel loading
+def load_excel(data):
+    try:
+        return pd.read_excel(BytesIO(data), engine="calamine")
+    except Exception:
+        # Fall back to pandas' engine inference (xlrd for legacy .xls, openpyxl for .xlsx)
+        return pd.read_excel(BytesIO(data))
+
+# Only text and datetime cells can hold dates; bare numbers would otherwise parse as epoch nanoseconds
+def is_datelike(value):
+    return isinstance(value, (str, datetime))
+
+# Single strftime format shared by a sample of date strings, or None if they are mixed
+def guess_date_format(sample):
+    first = sample.iloc[0]
+    if not isinstance(first, str):
+        return None
+    fmt = guess_datetime_format(first)
+    if fmt and pd.to_datetime(sample, errors="coerce", format=fmt).notna().all():
+        return fmt
+    return None
+
+# Preprocessing function: mutates the freshly loaded df and returns that same object, no copy
 def preprocess_data(df):
-    df.columns = [re.sub(r'[^a-zA-Z0-9]', '_', str(col).lower().strip()) for col in df.columns]
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            try:
-                df[col] = pd.to_datetime(df[col])
-            except:
-                pass
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            df[col].fillna('Unknown', inplace=True)
-        elif pd.api.types.is_numeric_dtype(df[col]):
-            df[col].fillna(df[col].median(), inplace=True)
+    df.columns = pd.Index(df.columns).astype(str).str.strip().str.lower().str.replace(_COL_SANITIZE_RE, '_', regex=True)
+    for col in df.select_dtypes(include='object').columns:
+        # Probe a small sample so text columns are rejected without a full-column parse
+        sample = df[col].dropna().head(50)
+        datelike = sample[sample.map(is_datelike)]
+        parsed = pd.to_datetime(datelike, errors="coerce", format="mixed")
+        # The ratio is over all sampled cells, so numeric cells count against the column
+        if len(sample) and parsed.notna().sum() > 0.8 * len(sample):
+            values = df[col].where(df[col].map(is_datelike))
+            fmt = guess_date_format(datelike)
+            converted = pd.to_datetime(values, errors="coerce", format=fmt or "mixed", cache=True)
+            if fmt:
+                # The format only comes from the sample; re-parse any later rows it missed
+                missed = converted.isna() & values.notna()
+                if missed.any():
+                    converted[missed] = pd.to_datetime(values[missed], errors="coerce", format="mixed")
+            df[col] = converted
+    # Only columns that actually have gaps get a fill value (skips medians of complete columns)
+    na_cols = df.columns[df.isna().any()]
+    obj_cols = df.select_dtypes(include='object').columns.intersection(na_cols)
+    num_cols = df.select_dtypes(include='number').columns.intersection(na_cols)
+    fills = dict.fromkeys(obj_cols, 'Unknown')
+    fills.update(df[num_cols].median())
+    if fills:
+        df[list(fills)] = df[list(fills)].fillna(fills)
+    # Downcast numerics; pandas keeps the wider dtype when values would not survive the cast
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in df.select_dtypes(include='floating').columns:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    # Low-cardinality text columns become categoricals so groupby/nunique work on integer codes
+    for col in df.select_dtypes(include='object').columns:
+        nunq = df[col].nunique(dropna=False)
+        if 0 < nunq < 1000 and nunq / len(df) < 0.5:
+            df[col] = df[col].astype('category')
     return df
 
-# Visualization function
-def generate_visualization(df, query):
+# Read + preprocess once per upload; keyed on the content hash so reruns skip hashing the file bytes.
+# The preprocessed frame is also persisted as parquet so re-uploads in later sessions skip both steps.
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_data(file_key, _data):
+    cache_path = CACHE_DIR / f"{file_key}.preprocessed-v{PREPROCESS_VERSION}.parquet"
+    if cache_path.exists() and time.time() - cache_path.stat().st_mtime <= CACHE_MAX_AGE:
+        return pd.read_parquet(cache_path)
+    df = preprocess_data(load_excel(_data))
     try:
-        fig, ax = plt.subplots(figsize=(10, 5))
-        query_lower = query.lower()
-
-        num_cols = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
-        cat_cols = [col for col in df.columns if not pd.api.types.is_numeric_dtype(df[col]) and df[col].nunique() < 20]
-        date_cols = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
-
-        if any(word in query_lower for word in ["trend", "over time", "month", "year", "timeline"]) and date_cols:
-            y_col = num_cols[0] if num_cols else None
-            if y_col:
-                df_sorted = df.sort_values(by=date_cols[0])
-                sns.lineplot(x=df_sorted[date_cols[0]], y=df_sorted[y_col], ax=ax)
-                ax.set_title(f"Trend of {y_col} over time")
-                ax.set_xlabel(date_cols[0])
-                ax.set_ylabel(y_col)
-                plt.xticks(rotation=45)
-                st.pyplot(fig)
-                return
-
-        elif any(word in query_lower for word in ["distribution", "histogram", "spread", "frequency"]):
-            if num_cols:
-                sns.histplot(df[num_cols[0]], bins=20, kde=True, ax=ax)
-                ax.set_title(f"Distribution of {num_cols[0]}")
-                ax.set_xlabel(num_cols[0])
-                st.pyplot(fig)
-                return
-
-        elif any(word in query_lower for word in ["compare", "group", "by", "bar chart"]):
-            if cat_cols and num_cols:
-                cat_col = cat_cols[0]
-                sns.barplot(x=cat_col, y=num_cols[0], data=df, estimator=np.mean, ax=ax)
-                ax.set_title(f"Average {num_cols[0]} by {cat_col}")
-                ax.set_xlabel(cat_col)
-                ax.set_ylabel(f"Average {num_cols[0]}")
-                plt.xticks(rotation=45)
-                st.pyplot(fig)
-                return
-
-        elif "pie" in query_lower and cat_cols:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        df.to_parquet(tmp_path)
+        tmp_path.replace(cache_path)
+        prune_cache()
+    except Exception:
+        # Not every sheet is parquet-serializable (e.g. mixed-type columns); skip the disk cache
+        pass
+    return df
+
+# Distinct-value count; categoricals answer from their categories without scanning rows
+def cardinality(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return len(series.cat.categories)
+    return series.nunique()
+
+# Column-type classification, computed once per upload
+@st.cache_data(show_spinner=False, max_entries=8)
+def classify_columns(file_key, _df):
+    return {
+        'num': _df.select_dtypes(include='number').columns.tolist(),
+        'date': _df.select_dtypes(include='datetime').columns.tolist(),
+        'cat': [col for col in _df.select_dtypes(include=['object', 'category']).columns if cardinality(_df[col]) < 20],
+    }
+
+# Group mean of values per category, in one bincount pass over the integer codes
+def category_mean(cats, values):
+    codes = cats.cat.codes.to_numpy()
+    vals = values.to_numpy(dtype='float64')
+    mask = (codes >= 0) & ~np.isnan(vals)
+    n = len(cats.cat.categories)
+    sums = np.bincount(codes[mask], weights=vals[mask], minlength=n)
+    counts = np.bincount(codes[mask], minlength=n)
+    observed = counts > 0
+    index = pd.Index(cats.cat.categories[observed], name=cats.name)
+    return pd.Series(sums[observed] / counts[observed], index=index, name=values.name)
+
+# Summary statistics: median as the only percentile, text/category/bool columns described separately
+def describe_data(df):
+    parts = []
+    num_df = df.select_dtypes(include=['number', 'datetime'])
+    if len(num_df.columns):
+        parts.append(num_df.describe(percentiles=[0.5]))
+    cat_df = df.select_dtypes(include=['object', 'category', 'bool'])
+    if len(cat_df.columns):
+        parts.append(cat_df.describe())
+    return pd.concat(parts, axis=1) if parts else pd.DataFrame()
+
+# Histogram counts plus a Gaussian KDE curve scaled to the same counts
+def histogram_data(series, bins=20, grid_size=200):
+    values = series.dropna().to_numpy(dtype='float64')
+    counts, edges = np.histogram(values, bins=bins)
+    kde = None
+    if len(values) > 1 and values.std() > 0:
+        # Scott's rule bandwidth, with the kernel summed over a fine pre-binned grid instead of every row
+        bw = values.std(ddof=1) * len(values) ** -0.2
+        fine_counts, fine_edges = np.histogram(values, bins=grid_size)
+        grid = (fine_edges[:-1] + fine_edges[1:]) / 2
+        weights = np.exp(-0.5 * ((grid[:, None] - grid[None, :]) / bw) ** 2) @ fine_counts
+        kde = (grid, weights * (edges[1] - edges[0]) / (bw * np.sqrt(2 * np.pi)))
+    return counts, edges, kde
+
+# Smallest calendar bucket that keeps a trend over these dates within TREND_MAX_POINTS
+def trend_bucket(dates):
+    span = dates.max() - dates.min()
+    for freq, width in _TREND_BUCKETS:
+        if span / width <= TREND_MAX_POINTS:
+            return freq
+    return _TREND_BUCKETS[-1][0]
+
+# Visualization data preparation (pure pandas, no plotting)
+def prepare_visualization(df, query, cols):
+    num_cols, cat_cols, date_cols = cols['num'], cols['cat'], cols['date']
+
+    if _TREND_RE.search(query) and date_cols:
+        y_col = num_cols[0] if num_cols else None
+        if y_col:
+            date_col = date_cols[0]
+            if df[date_col].nunique() <= TREND_MAX_POINTS:
+                agg = df.groupby(date_col)[y_col].mean()
+            else:
+                # Resample to a bucket sized from the time span so only the plotted points reach matplotlib
+                bucket = pd.Grouper(key=date_col, freq=trend_bucket(df[date_col]))
+                agg = df.groupby(bucket)[y_col].mean().dropna()
+            return {"kind": "line", "data": agg,
+                    "title": f"Trend of {y_col} over time", "xlabel": date_cols[0], "ylabel": y_col}
+
+    elif _DIST_RE.search(query):
+        if num_cols:
+            counts, edges, kde = histogram_data(df[num_cols[0]])
+            return {"kind": "hist", "counts": counts, "edges": edges, "kde": kde,
+                    "title": f"Distribution of {num_cols[0]}", "xlabel": num_cols[0], "ylabel": "Count"}
+
+    elif _CMP_RE.search(query):
+        if cat_cols and num_cols:
             cat_col = cat_cols[0]
-            pie_data = df[cat_col].value_counts()
-            fig, ax = plt.subplots()
-            ax.pie(pie_data.values, labels=pie_data.index, autopct='%1.1f%%')
-            ax.set_title(f"Pie chart of {cat_col}")
-            st.pyplot(fig)
-            return
+            if isinstance(df[cat_col].dtype, pd.CategoricalDtype):
+                agg = category_mean(df[cat_col], df[num_cols[0]]).sort_values()
+            else:
+                agg = df.groupby(cat_col, observed=True)[num_cols[0]].mean().sort_values()
+            return {"kind": "bar", "data": agg,
+                    "title": f"Average {num_cols[0]} by {cat_col}", "xlabel": cat_col, "ylabel": f"Average {num_cols[0]}"}
+
+    elif _PIE_RE.search(query) and cat_cols:
+        cat_col = cat_cols[0]
+        counts = df[cat_col].value_counts()
+        counts.index = counts.index.astype(str)
+        if len(counts):
+            # Keep the largest slices and fold the tail (plus any real "Other" value) into one "Other" wedge
+            top = counts.drop("Other", errors="ignore").head(8).copy()
+            other = counts.sum() - top.sum()
+            if other:
+                top["Other"] = other
+            return {"kind": "pie", "counts": top, "title": f"Pie chart of {cat_col}"}
+
+    else:
+        return {"kind": "summary", "table": describe_data(df)}
+
+    return None
+
+# Memoized chart data per (upload, query); figures themselves are rebuilt on render
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=256)
+def cached_visualization(file_key, _df, _cols, query):
+    return prepare_visualization(_df, query, _cols)
+
+# Visualization rendering (matplotlib/Streamlit calls only)
+def render_visualization(viz):
+    if viz is None:
+        return
 
-        else:
-            st.markdown("No matching chart. Displaying statistical summary:")
-            st.dataframe(df.describe(include='all'))
+    # Plotting libraries are imported on first use to keep them off the cold-start path
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
 
+    if viz["kind"] == "summary":
+        st.markdown("No matching chart. Displaying statistical summary:")
+        st.dataframe(viz["table"])
+        return
+
+    fig, ax = plt.subplots(figsize=(10, 5))
+    try:
+        if viz["kind"] == "line":
+            ax.plot(viz["data"].index, viz["data"].values)
+            ax.tick_params(axis='x', labelrotation=45)
+
+        elif viz["kind"] == "hist":
+            ax.stairs(viz["counts"], viz["edges"], fill=True, alpha=0.6)
+            if viz["kde"] is not None:
+                ax.plot(*viz["kde"])
+
+        elif viz["kind"] == "bar":
+            ax.bar(viz["data"].index.astype(str), viz["data"].values)
+            ax.tick_params(axis='x', labelrotation=45)
+
+        elif viz["kind"] == "pie":
+            ax.pie(viz["counts"].values, labels=viz["counts"].index, autopct='%1.1f%%')
+            ax.set_aspect('equal')
+
+        ax.set_title(viz["title"])
+        if "xlabel" in viz:
+            ax.set_xlabel(viz["xlabel"])
+        if "ylabel" in viz:
+            ax.set_ylabel(viz["ylabel"])
+        st.pyplot(fig)
+    finally:
+        # pyplot keeps every figure alive until it is closed explicitly
+        plt.close(fig)
+
+# Visualization function
+def generate_visualization(file_key, df, query, cols):
+    try:
+        render_visualization(cached_visualization(file_key, df, cols, query))
     except Exception as e:
         st.error(f"❌ Visualization error: {str(e)}")
 
 # Query interpretation without OpenAI
-def basic_analysis(df, query):
+def basic_analysis(df, query, cols):
     query = query.lower()
+    num_cols, cat_cols = cols['num'], cols['cat']
+    # Column names are normalized to [a-z0-9_], so whole tokens match them exactly
+    tokens = set(_TOKEN_RE.findall(query))
     try:
-        if "average" in query or "mean" in query:
-            for col in df.select_dtypes(include=np.number).columns:
-                if col in query:
+        if _AVG_RE.search(query):
+            for col in num_cols:
+                if col in tokens:
                     return f"The average of {col} is {df[col].mean():.2f}"
 
-        elif "how many" in query or "count" in query:
-            match = re.search(r'(under|below|less than)\s+(\d+)', query)
+        elif _COUNT_RE.search(query):
+            match = _UNDER_RE.search(query)
             if match:
                 num = int(match.group(2))
-                for col in df.select_dtypes(include=np.number).columns:
-                    if col in query:
-                        count = (df[col] < num).sum()
+                for col in num_cols:
+                    if col in tokens:
+                        count = int(np.count_nonzero(df[col].to_numpy() < num))
                         return f"There are {count} rows where {col} is less than {num}."
 
-        elif "compare" in query or "group by" in query:
-            cat_cols = [col for col in df.columns if df[col].nunique() < 20 and df[col].dtype == 'object']
-            num_cols = df.select_dtypes(include=np.number).columns.tolist()
+        elif _GROUP_RE.search(query):
             if cat_cols and num_cols:
-                result = df.groupby(cat_cols[0])[num_cols[0]].mean().reset_index()
+                result = df.groupby(cat_cols[0], observed=True)[num_cols[0]].mean().reset_index()
                 return result
 
         return "❌ Could not interpret your question. Try rephrasing."
     except Exception as e:
         return f"Error: {str(e)}"
 
+# Memoized analysis per (upload, query); the DataFrame itself is not hashed
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=256)
+def cached_analysis(file_key, _df, _cols, query):
+    return basic_analysis(_df, query, _cols)
+
 # Main app logic
 def main():
     st.title("📊 Excel Data Chatbot")
@@ -118,8 +355,14 @@ def main():
     uploaded_file = st.file_uploader("Upload Excel File", type=["xlsx", "xls"])
 
     if uploaded_file is not None:
-        df = pd.read_excel(uploaded_file)
-        df = preprocess_data(df)
+        data = uploaded_file.getvalue()
+        # Hash each upload once; later reruns reuse the key from session state
+        if st.session_state.get("file_id") != uploaded_file.file_id:
+            st.session_state.file_id = uploaded_file.file_id
+            st.session_state.file_key = content_key(data)
+        file_key = st.session_state.file_key
+        df = load_data(file_key, data)
+        cols = classify_columns(file_key, df)
 
         if df is not None:
             st.success("Data loaded successfully!")
@@ -133,20 +376,13 @@ def main():
 
             if query:
                 with st.spinner("Analyzing..."):
-                    result = basic_analysis(df, query)
+                    result = cached_analysis(file_key, df, cols, query)
                     st.markdown("### Result")
                     st.write(result)
-                    generate_visualization(df, query)
+                    generate_visualization(file_key, df, query, cols)
 
     with st.expander("💡 Sample Questions"):
-        st.markdown("""
-        - What is the average income?
-        - How many customers are under 30?
-        - Compare loan amount by education
-        - Show distribution of balance
-        - Show trend of income over time
-        - Show pie chart of job category
-        """)
+        st.markdown(_SAMPLE_MD)
 
 if __name__ == "__main__":
     main()
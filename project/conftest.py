@@ -0,0 +1 @@
+# Lets tests import app.py from the project directory
@@ -0,0 +1,61 @@
+import os
+import time
+
+import pandas as pd
+
+import app
+
+
+def test_pie_merges_real_other_category_into_tail():
+    values = [f"c{i}" for i in range(8) for _ in range(10)] + ["Other"] * 5 + ["t1"] * 4 + ["t2"] * 5
+    df = pd.DataFrame({"label": values})
+    viz = app.prepare_visualization(df, "pie chart of label", {"num": [], "date": [], "cat": ["label"]})
+    counts = viz["counts"]
+    assert counts["Other"] == 14
+    assert counts.sum() == len(df)
+    assert list(counts.index).count("Other") == 1
+
+
+def test_dates_outside_sampled_format_are_not_dropped():
+    dates = [f"2023-01-{d:02d}" for d in range(1, 31)] * 2
+    tail = ["2023-02-01 10:30", "05/03/2023", "2023-03-15T08:00:00"]
+    df = app.preprocess_data(pd.DataFrame({"when": dates + tail}))
+    assert pd.api.types.is_datetime64_any_dtype(df["when"])
+    assert df["when"].notna().all()
+    assert df["when"].iloc[-1] == pd.Timestamp("2023-03-15 08:00:00")
+
+
+def test_prune_cache_drops_expired_and_surplus_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(app, "CACHE_MAX_FILES", 2)
+    now = time.time()
+    for i, age in enumerate([0, 10, 20, app.CACHE_MAX_AGE + 1]):
+        path = tmp_path / f"f{i}.parquet"
+        path.write_bytes(b"")
+        os.utime(path, (now - age, now - age))
+    app.prune_cache()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["f0.parquet", "f1.parquet"]
+
+
+def test_summary_covers_bool_columns():
+    df = pd.DataFrame({"amount": [1.0, 2.0, 3.0], "flag": [True, False, True], "job": ["a", "b", "a"]})
+    table = app.describe_data(df)
+    assert set(table.columns) == {"amount", "flag", "job"}
+
+
+def test_numeric_column_with_text_cell_is_not_parsed_as_dates():
+    df = app.preprocess_data(pd.DataFrame({"score": [10, 20, 30, 40, 50, 60, 70, 80, 90, "N/A"],
+                                           "ratio": [0.5, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5, 7.5, 8.5, "n/a"]}))
+    assert not pd.api.types.is_datetime64_any_dtype(df["score"])
+    assert not pd.api.types.is_datetime64_any_dtype(df["ratio"])
+    assert list(df["score"].iloc[:3]) == [10, 20, 30]
+
+
+def test_trend_keeps_intraday_points_and_buckets_long_spans():
+    cols = {"num": ["value"], "date": ["when"], "cat": []}
+    hourly = pd.DataFrame({"when": pd.date_range("2024-01-01", periods=48, freq="h"), "value": range(48)})
+    assert len(app.prepare_visualization(hourly, "show trend", cols)["data"]) == 48
+
+    minutely = pd.DataFrame({"when": pd.date_range("2020-01-01", periods=5000, freq="37min"), "value": 1.0})
+    points = len(app.prepare_visualization(minutely, "show trend", cols)["data"])
+    assert 1 < points <= app.TREND_MAX_POINTS